@@ -6,22 +6,64 @@ import os
 import sys
 import dbus
 import dbus.service
-if sys.version_info.major == 2:
-    import gobject
-else:
-    from gi.repository import GLib as gobject
 import sys
 import time
 import configparser # for config/ini file
  
 # goodwe library and asyncio
 import asyncio
+import gbulb # asyncio event loop on top of the GLib main loop
 import goodwe as goodwe
 
 # our own packages from victron
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), '/opt/victronenergy/dbus-systemcalc-py/ext/velib_python'))
 from vedbus import VeDbusService
 
+# polling interval in seconds, doubled while pv power is stable (only without a grid meter)
+POLL_INTERVAL_MIN = 5
+POLL_INTERVAL_MAX = 60
+# power change (W) under which readings are considered stable
+POLL_STABLE_DELTA = 10
+
+# seconds runtime data read from the inverter is reused for
+RUNTIME_DATA_TTL = 2
+
+#formatting, gettextcallback(path, value) for the dbus paths
+def _kwh(p, v):
+  return str(round(v, 2)) + 'KWh'
+
+def _a(p, v):
+  return str(round(v, 1)) + 'A'
+
+def _w(p, v):
+  return str(round(v, 1)) + 'W'
+
+def _v(p, v):
+  return str(round(v, 1)) + 'V'
+
+# (path, default value, text formatter) for the paths specific to each service
+PV_PATHS = (
+  ('/Ac/Energy/Forward', None, _kwh),
+  ('/Ac/Power', 0, _w),
+  ('/Ac/Current', 0, _a),
+  ('/Ac/Voltage', 0, _v),
+  ('/Ac/L1/Voltage', 0, _v),
+  ('/Ac/L1/Current', 0, _a),
+  ('/Ac/L1/Power', 0, _w),
+  ('/Ac/L1/Energy/Forward', None, _kwh),
+)
+
+GRID_PATHS = (
+  ('/Ac/L1/Energy/Forward', None, _kwh),
+  ('/Ac/L1/Energy/Reverse', None, _kwh),
+  ('/Ac/Energy/Forward', None, _kwh),
+  ('/Ac/Energy/Reverse', None, _kwh),
+  ('/Ac/Power', 0, _w),
+  ('/Ac/L1/Current', 0, _a),
+  ('/Ac/L1/Voltage', 0, _v),
+  ('/Ac/L1/Power', 0, _w),
+)
+
 class SystemBus(dbus.bus.BusConnection):
     def __new__(cls):
         return dbus.bus.BusConnection.__new__(cls, dbus.bus.BusConnection.TYPE_SYSTEM)
@@ -74,15 +116,17 @@ class VictronDbusService():
 class GoodWeEMService:
   """ GoodWe Inverter and SmartMeter class
   """
-  def __init__(self, product_name='GoodWe EM', connection='GoodWe EM service'):
+  def __init__(self, loop, product_name='GoodWe EM', connection='GoodWe EM service'):
     """Creates a GoodWeEMService object to interact with GoodWe Inverter and SmartMeter, 
     it also handles configuration management and Dbus updates
 
     Args:
+        loop (asyncio.AbstractEventLoop): GLib backed event loop (gbulb) updates are scheduled on.
         product_name (str, optional): _description_. Defaults to 'GoodWe EM'.
         connection (str, optional): _description_. Defaults to 'GoodWe EM service'.
     """
-    config = self._get_config()
+    # config.ini doesn't change at runtime, parse it only once
+    config = self._load_config()
 
     self.dbus_service = None
     self.custom_name = config['DEFAULT']['CustomName']
@@ -98,43 +142,63 @@ class GoodWeEMService:
     if self.has_meter:
       self.meter_product_name = config['SMARTMETER']['ProductName']
 
-    #formatting 
-    self._kwh = lambda p, v: (str(round(v, 2)) + 'KWh')
-    self._a = lambda p, v: (str(round(v, 1)) + 'A')
-    self._w = lambda p, v: (str(round(v, 1)) + 'W')
-    self._v = lambda p, v: (str(round(v, 1)) + 'V') 
+    # GLib backed event loop (gbulb) and one connected inverter kept across polls
+    self._loop = loop
+    self._inverter = None
+    # asyncio only keeps weak references to tasks, hold the running update
+    self._update_task = None
+    # last runtime data read and when (time.monotonic), see RUNTIME_DATA_TTL
+    self._cached_data = None
+    self._cached_ts = 0
+
+    # adaptive polling, see _update_interval
+    self._interval = POLL_INTERVAL_MIN
+    self._last_power = None
 
-    logging.debug("%s /DeviceInstance = %d" % (self.custom_name, self.device_instance))
+    logging.debug("%s /DeviceInstance = %d", self.custom_name, self.device_instance)
 
   def set_dbus_service(self, dbus_service):
     self.dbus_service = dbus_service
 
-  def _get_config(self):
+    # hoist the services once, so updates don't look them up every poll
+    self._pv = dbus_service['pvinverter']
+    # update grid meter only if it's configured
+    self._grid = dbus_service.get('grid') if self.has_meter else None
+
+  def _load_config(self):
     config = configparser.ConfigParser()
     config.read("%s/config.ini" % (os.path.dirname(os.path.realpath(__file__))))
     return config
 
-  async def _get_goodwe_data(self, host):
+  async def _get_goodwe_data(self):
     # ToDo: Read sensor data unit
-    inverter = await goodwe.connect(host)
-    meter_data = await inverter.read_runtime_data()
+    # repeated calls within RUNTIME_DATA_TTL don't hit the inverter again
+    if self._cached_data is not None and time.monotonic() - self._cached_ts < RUNTIME_DATA_TTL:
+      return self._cached_data
+
+    # connect (device discovery) only once, reuse the inverter afterwards
+    if self._inverter is None:
+      self._inverter = await goodwe.connect(self.pv_host)
+    meter_data = await self._inverter.read_runtime_data()
     
     # check for response
     if not meter_data:
-        raise ConnectionError("No response from GoodWe EM - %s" % (host))
+        raise ConnectionError("No response from GoodWe EM - %s" % (self.pv_host))
     
+    # TTL counts from when the data arrived, a read can take a while with UDP retries
+    self._cached_data = meter_data
+    self._cached_ts = time.monotonic()
     return meter_data
  
   def _get_goodwe_serial(self):
     # Dummy function to retrieve a "serial" identifier, using custom name for now
-    config = self._get_config()
-    return config['DEFAULT']['CustomName']
+    return self.custom_name
 
-  def refresh_meter_data(self):   
+  async def refresh_meter_data(self):   
     try:
 
       #get data from GoodWe EM through Goodwe python library in async
-      meter_data = asyncio.run(self._get_goodwe_data(self.pv_host))       
+      meter_data = await self._get_goodwe_data()
       
       # ppv = for photo voltaic voltage
       self.pv_power = meter_data['ppv']
@@ -148,81 +212,110 @@ class GoodWeEMService:
       # Only if we have a smart meter setted up, almost all the values are the same with the exception of house_consumption
       if self.has_meter:
         # ToDo: review and fix -abs, we're negative abs as Victron expects negative values on export
-        self.meter_forward = meter_data['pgrid'] * -1
+        grid_power = -meter_data['pgrid']
+        house_consumption = meter_data['house_consumption']
+        self.meter_forward = grid_power
         # reverse is "sold to the grid"
-        self.meter_reverse = (meter_data['pgrid'] * -1) - meter_data['house_consumption'] # sold to the grid
+        self.meter_reverse = grid_power - house_consumption # sold to the grid
         # house consumption is total AC load
-        self.meter_house_consumption = meter_data['house_consumption']
+        self.meter_house_consumption = house_consumption
         # igrid = AC current, not differentiated by the smart meter
-        self.meter_current = meter_data['igrid']
-        self.meter_power = meter_data['pgrid'] * -1
-        self.meter_voltage = meter_data['vgrid']
+        self.meter_current = self.pv_current
+        self.meter_power = grid_power
+        self.meter_voltage = self.pv_voltage
 
     except Exception as e:
+      # force a reconnect on the next cycle
+      self._inverter = None
       logging.critical('Error at %s', '_update', exc_info=e)
+      return False
        
     return True
  
-  def update_dbus_pv_inverter(self):
+  def _update_interval(self):
+    # back off while pv power is stable (e.g. at night), poll fast again on changes
+    # ESS uses the grid meter's /Ac/Power for control, so a grid meter is always polled at the fast rate
+    if self.has_meter:
+      return
+    power = self.pv_power
+    if self._last_power is not None and abs(power - self._last_power) < POLL_STABLE_DELTA:
+      self._interval = min(self._interval * 2, POLL_INTERVAL_MAX)
+    else:
+      self._interval = POLL_INTERVAL_MIN
+    self._last_power = power
+
+  def schedule_update(self, delay=POLL_INTERVAL_MIN):
+    """Schedules the next update_dbus_pv_inverter run on the event loop
+
+    Args:
+        delay (int, optional): seconds to wait before the update. Defaults to POLL_INTERVAL_MIN.
+    """
+    self._loop.call_later(delay, self._start_update)
+
+  def _start_update(self):
+    self._update_task = self._loop.create_task(self.update_dbus_pv_inverter())
+
+  async def update_dbus_pv_inverter(self):
     """_summary_
-    updates dbus as a callback function, dbus is setted on the GoodWe EM Class
-    Returns:
-        _type_: _description_
+    updates dbus as a scheduled task, dbus is setted on the GoodWe EM Class
+    D-Bus keeps being serviced while the inverter read is awaited
     """
-    dbus_service = self.dbus_service
+    pv = self._pv
     try:
-      self.refresh_meter_data()
-      pre = '/Ac/L1'
+      if not await self.refresh_meter_data():
+        # no fresh data, don't publish stale values and retry the inverter soon
+        self._interval = POLL_INTERVAL_MIN
+        return
       #current = power / voltage
-      dbus_service['pvinverter'][pre + '/Voltage'] = self.pv_voltage
-      dbus_service['pvinverter'][pre + '/Current'] = self.pv_current
-      dbus_service['pvinverter'][pre + '/Power'] = self.pv_power
       if self.pv_power > 0:
-        dbus_service['pvinverter'][pre + '/Energy/Forward'] = self.pv_total # already in kWh
+        voltage, current, power = self.pv_voltage, self.pv_current, self.pv_power
+        energy_forward = self.pv_total # already in kWh
       else:
-        dbus_service['pvinverter'][pre + '/Voltage'] = 0
-        dbus_service['pvinverter'][pre + '/Current'] = 0
-        dbus_service['pvinverter'][pre + '/Power'] = 0
-        dbus_service['pvinverter'][pre + '/Energy/Forward'] = 0
+        voltage, current, power, energy_forward = 0, 0, 0, 0
+      pv['/Ac/L1/Voltage'] = voltage
+      pv['/Ac/L1/Current'] = current
+      pv['/Ac/L1/Power'] = power
+      pv['/Ac/L1/Energy/Forward'] = energy_forward
           
-      dbus_service['pvinverter']['/Ac/Power'] = dbus_service['pvinverter']['/Ac/L1/Power']
-      dbus_service['pvinverter']['/Ac/Current'] = dbus_service['pvinverter']['/Ac/L1/Current']
-      dbus_service['pvinverter']['/Ac/Energy/Forward'] = dbus_service['pvinverter']['/Ac/L1/Energy/Forward']
+      pv['/Ac/Power'] = power
+      pv['/Ac/Current'] = current
+      pv['/Ac/Energy/Forward'] = energy_forward
       
       # update grid meter only if it's configured
-      if self.has_meter:
-        if 'grid' in dbus_service:
-          logging.debug("Updating meter values")
-          pre = '/Ac/L1'
-          #current = power / voltage
-          dbus_service['grid'][pre + '/Voltage'] = self.meter_voltage
-          dbus_service['grid'][pre + '/Current'] = self.meter_current
-          dbus_service['grid'][pre + '/Power'] = self.meter_power
-          
-          # converting watts to kWh, sample 1 minute as required by forward and reverse
-          dbus_service['grid']['/Ac/Energy/Forward'] = self.meter_forward / 1000 / 60
-          dbus_service['grid']['/Ac/Energy/Reverse'] = self.meter_reverse / 1000 / 60
-          dbus_service['grid']['/Ac/L1/Energy/Forward'] = self.meter_forward / 1000 / 60
-          dbus_service['grid']['/Ac/L1/Energy/Reverse'] = self.meter_reverse / 1000 / 60
-          dbus_service['grid']['/Ac/Power'] = self.meter_power          
+      grid = self._grid
+      if grid is not None:
+        logging.debug("Updating meter values")
+        #current = power / voltage
+        grid['/Ac/L1/Voltage'] = self.meter_voltage
+        grid['/Ac/L1/Current'] = self.meter_current
+        grid['/Ac/L1/Power'] = self.meter_power
+        
+        # converting watts to kWh, sample 1 minute as required by forward and reverse
+        forward = self.meter_forward / 60000
+        reverse = self.meter_reverse / 60000
+        grid['/Ac/Energy/Forward'] = forward
+        grid['/Ac/Energy/Reverse'] = reverse
+        grid['/Ac/L1/Energy/Forward'] = forward
+        grid['/Ac/L1/Energy/Reverse'] = reverse
+        grid['/Ac/Power'] = self.meter_power
 
       #logging
-      logging.debug("House Consumption (/Ac/Power): %s" % (dbus_service['pvinverter']['/Ac/Power']))
-      logging.debug("House Forward (/Ac/Energy/Forward): %s" % (dbus_service['pvinverter']['/Ac/Energy/Forward']))
-      logging.debug("---")
+      # skip the dbus lookups when debug logging is off
+      if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("House Consumption (/Ac/Power): %s", pv['/Ac/Power'])
+        logging.debug("House Forward (/Ac/Energy/Forward): %s", pv['/Ac/Energy/Forward'])
+        logging.debug("---")
       
       # increment UpdateIndex - to show that new data is available
-      index = dbus_service['pvinverter']['/UpdateIndex'] + 1  # increment index
-      if index > 255:   # maximum value of the index
-        index = 0       # overflow from 255 to 0
-      dbus_service['pvinverter']['/UpdateIndex'] = index
+      pv['/UpdateIndex'] = (pv['/UpdateIndex'] + 1) & 0xFF  # overflow from 255 to 0
 
-      #update lastupdate vars
-      self._dbus_last_update = time.time()    
+      self._update_interval()
     except Exception as e:
+      self._interval = POLL_INTERVAL_MIN
       logging.critical('Error at %s', '_update', exc_info=e)
-
-    return True
+    finally:
+      # pause before the next request
+      self.schedule_update(self._interval)
 
 def main():
   #configure logging
@@ -239,8 +332,12 @@ def main():
   from dbus.mainloop.glib import DBusGMainLoop
   # Have a mainloop, so we can send/receive asynchronous calls to and from dbus
   DBusGMainLoop(set_as_default=True)
+  # run asyncio on the same GLib main loop, so inverter reads don't block dbus
+  # note: a different loop policy (e.g. uvloop) would stop the GLib loop, and dbus with it, from running
+  gbulb.install(gtk=False)
+  loop = asyncio.get_event_loop()
   
-  goodwe_inverter = GoodWeEMService()
+  goodwe_inverter = GoodWeEMService(loop)
   victron_dbus = VictronDbusService()
 
   try:
@@ -257,14 +354,8 @@ def main():
       product_name=goodwe_inverter.product_name, custom_name=goodwe_inverter.custom_name, type="pvinverter"  )
 
       # add paths specific to pv inverter
-      dbusservice['pvinverter'].add_path('/Ac/Energy/Forward', None, writeable=True, gettextcallback = goodwe_inverter._kwh)
-      dbusservice['pvinverter'].add_path('/Ac/Power', 0, writeable=True, gettextcallback = goodwe_inverter._w)
-      dbusservice['pvinverter'].add_path('/Ac/Current', 0, writeable=True, gettextcallback = goodwe_inverter._a)
-      dbusservice['pvinverter'].add_path('/Ac/Voltage', 0, writeable=True, gettextcallback = goodwe_inverter._v)
-      dbusservice['pvinverter'].add_path('/Ac/L1/Voltage', 0, writeable=True, gettextcallback = goodwe_inverter._v)
-      dbusservice['pvinverter'].add_path('/Ac/L1/Current', 0, writeable=True, gettextcallback = goodwe_inverter._a)
-      dbusservice['pvinverter'].add_path('/Ac/L1/Power', 0, writeable=True, gettextcallback = goodwe_inverter._w)
-      dbusservice['pvinverter'].add_path('/Ac/L1/Energy/Forward', None, writeable=True, gettextcallback = goodwe_inverter._kwh)
+      for path, default, text in PV_PATHS:
+        dbusservice['pvinverter'].add_path(path, default, writeable=True, gettextcallback = text)
       # Position is required to establish on which line the inverter sits (AC OUT, In, ETC)
       dbusservice['pvinverter'].add_path('/Position', goodwe_inverter.pv_inverter_position, writeable=True)
       dbusservice['pvinverter'].add_path('/MaxPower', goodwe_inverter.pv_max_power, writeable=True)
@@ -276,14 +367,8 @@ def main():
         product_name=goodwe_inverter.meter_product_name, custom_name=goodwe_inverter.meter_product_name, type="grid"  )
 
 
-        dbusservice['grid'].add_path('/Ac/L1/Energy/Forward', None, writeable=True, gettextcallback = goodwe_inverter._kwh)
-        dbusservice['grid'].add_path('/Ac/L1/Energy/Reverse', None, writeable=True, gettextcallback = goodwe_inverter._kwh)
-        dbusservice['grid'].add_path('/Ac/Energy/Forward', None, writeable=True, gettextcallback = goodwe_inverter._kwh)
-        dbusservice['grid'].add_path('/Ac/Energy/Reverse', None, writeable=True, gettextcallback = goodwe_inverter._kwh)
-        dbusservice['grid'].add_path('/Ac/Power', 0, writeable=True, gettextcallback = goodwe_inverter._w)
-        dbusservice['grid'].add_path('/Ac/L1/Current', 0, writeable=True, gettextcallback = goodwe_inverter._a)
-        dbusservice['grid'].add_path('/Ac/L1/Voltage', 0, writeable=True, gettextcallback = goodwe_inverter._v)
-        dbusservice['grid'].add_path('/Ac/L1/Power', 0, writeable=True, gettextcallback = goodwe_inverter._w)
+        for path, default, text in GRID_PATHS:
+          dbusservice['grid'].add_path(path, default, writeable=True, gettextcallback = text)
         dbusservice['grid'].add_path('/Position', goodwe_inverter.pv_inverter_position, writeable=True)
         
 
@@ -291,11 +376,10 @@ def main():
       goodwe_inverter.set_dbus_service(dbusservice)
       # add _update function 'timer'
       # update every 5 seconds to prevent blocking by GoodWe Inverter
-      gobject.timeout_add(5000, goodwe_inverter.update_dbus_pv_inverter) # pause 5000ms before the next request
+      goodwe_inverter.schedule_update(POLL_INTERVAL_MIN)
 
-      logging.info('Connected to dbus, and switching over to gobject.MainLoop() (= event based)')
-      mainloop = gobject.MainLoop()
-      mainloop.run()            
+      logging.info('Connected to dbus, and switching over to GLib backed asyncio loop (= event based)')
+      loop.run_forever()
   except Exception as e:
     logging.critical('Error at %s', 'main', exc_info=e)
 if __name__ == "__main__":